@@ -6,8 +6,10 @@ This demo shows how the LaTeX Math FSM processes mathematical expressions token
 Similar to the HTTP FSM demo but for LaTeX mathematical syntax validation.
 """
 
+import io
 import sys
 from pathlib import Path
+from typing import Optional
 
 # Add src to path
 sys.path.append(str(Path(__file__).parent / "src"))
@@ -15,12 +17,13 @@ sys.path.append(str(Path(__file__).parent / "src"))
 from src.fsm import LaTeXMathFSM
 
 
-def demo_latex_fsm_step_by_step():
+def demo_latex_fsm_step_by_step(fsm: Optional[LaTeXMathFSM] = None):
     """Demonstrate the LaTeX Math FSM step by step."""
     print("🧮 LaTeX Math FSM Demo")
     print("=" * 35)
     
-    fsm = LaTeXMathFSM()
+    if fsm is None:
+        fsm = LaTeXMathFSM()
     
     # Test cases - various LaTeX math expressions
     test_cases = [
@@ -40,12 +43,14 @@ def demo_latex_fsm_step_by_step():
     ]
     
     for test_case in test_cases:
-        print(f"\n📝 Testing: '{test_case}'")
+        # Buffer each test case and write it out once
+        out = io.StringIO()
+        print(f"\n📝 Testing: '{test_case}'", file=out)
         fsm.reset()
         
         # Tokenize and show tokens
         tokens = fsm.tokenize(test_case)
-        print(f"   Tokens: {tokens}")
+        print(f"   Tokens: {tokens}", file=out)
         
         # Process step by step
         valid = True
@@ -55,7 +60,7 @@ def demo_latex_fsm_step_by_step():
             new_state = fsm.state
             
             status = "✅" if success else "❌"
-            print(f"   Step {i+1}: '{token}' | {old_state} → {new_state} {status}")
+            print(f"   Step {i+1}: '{token}' | {old_state} → {new_state} {status}", file=out)
             
             if not success:
                 valid = False
@@ -65,18 +70,20 @@ def demo_latex_fsm_step_by_step():
         is_complete = fsm.is_complete()
         final_status = "✅ VALID" if valid and is_complete else "❌ INVALID"
         
-        print(f"   Result: {final_status}")
-        print(f"   Final State: {fsm.state}")
-        print(f"   Complete: {is_complete}")
-        print(f"   State Info: {fsm.get_state_info()}")
+        print(f"   Result: {final_status}", file=out)
+        print(f"   Final State: {fsm.state}", file=out)
+        print(f"   Complete: {is_complete}", file=out)
+        print(f"   State Info: {fsm.get_state_info()}", file=out)
+        sys.stdout.write(out.getvalue())
 
 
-def demo_latex_fsm_possibilities():
+def demo_latex_fsm_possibilities(fsm: Optional[LaTeXMathFSM] = None):
     """Demonstrate valid next token possibilities."""
     print("\n\n🎯 LaTeX Math FSM - Valid Next Tokens Demo")
     print("=" * 50)
     
-    fsm = LaTeXMathFSM()
+    if fsm is None:
+        fsm = LaTeXMathFSM()
     
     # Test partial expressions
     partial_expressions = [
@@ -93,27 +100,36 @@ def demo_latex_fsm_possibilities():
         "$\\frac{a}{b",        # Content in denominator
     ]
     
+    # Buffer the report and write it out once
+    out = io.StringIO()
+    # Most entries extend the previous one; only walk the new tokens
+    fsm.reset()
+    walked = []
     for expr in partial_expressions:
-        print(f"\n📝 Partial expression: '{expr}'")
-        fsm.reset()
+        print(f"\n📝 Partial expression: '{expr}'", file=out)
+        tokens = fsm.tokenize(expr)
+        if tokens[:len(walked)] != walked:
+            fsm.reset()
+            walked = []
         
-        if expr:  # Not empty
-            tokens = fsm.tokenize(expr)
-            for token in tokens:
-                fsm.process_token(token)
+        for token in tokens[len(walked):]:
+            fsm.process_token(token)
+        walked = tokens
         
         possibilities = fsm.get_current_possibilities()
-        print(f"   Current state: {fsm.state}")
-        print(f"   Valid next tokens: {possibilities[:15]}...")  # Show first 15
-        print(f"   Total possibilities: {len(possibilities)}")
+        print(f"   Current state: {fsm.state}", file=out)
+        print(f"   Valid next tokens: {possibilities[:15]}...", file=out)  # Show first 15
+        print(f"   Total possibilities: {len(possibilities)}", file=out)
+    sys.stdout.write(out.getvalue())
 
 
-def demo_latex_fsm_validation():
+def demo_latex_fsm_validation(fsm: Optional[LaTeXMathFSM] = None):
     """Demonstrate validation of complete expressions."""
     print("\n\n✅ LaTeX Math FSM - Complete Validation Demo")
     print("=" * 55)
     
-    fsm = LaTeXMathFSM()
+    if fsm is None:
+        fsm = LaTeXMathFSM()
     
     expressions = [
         # Valid expressions
@@ -138,14 +154,17 @@ def demo_latex_fsm_validation():
     ]
     
     print("Testing complete expressions:")
-    for expr, expected in expressions:
-        fsm.reset()
-        result = fsm.process_input(expr)
+    out = io.StringIO()
+    results = fsm.validate_all([expr for expr, _ in expressions])
+    for (expr, expected), result in zip(expressions, results):
         status = "✅" if result == expected else "❌"
-        print(f"   {status} '{expr}' → {result} (expected: {expected})")
+        print(f"   {status} '{expr}' → {result} (expected: {expected})", file=out)
+    sys.stdout.write(out.getvalue())
 
 
 if __name__ == "__main__":
-    demo_latex_fsm_step_by_step()
-    demo_latex_fsm_possibilities()
-    demo_latex_fsm_validation()
+    # One FSM shared by all demos; each test case resets it
+    shared_fsm = LaTeXMathFSM()
+    demo_latex_fsm_step_by_step(shared_fsm)
+    demo_latex_fsm_possibilities(shared_fsm)
+    demo_latex_fsm_validation(shared_fsm)
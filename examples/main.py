@@ -9,9 +9,11 @@ Usage:
     python main.py
 """
 
+import io
 import os
 import sys
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -32,32 +34,36 @@ def print_banner():
     print()
 
 
-def demo_latex_fsm():
+def demo_latex_fsm(fsm: Optional[LaTeXMathFSM] = None):
     """Demonstrate the LaTeX Math FSM."""
     print("🟢 LaTeX Math FSM Demo")
     print("-" * 30)
     
     # Create LaTeX Math FSM
-    fsm = LaTeXMathFSM()
+    if fsm is None:
+        fsm = LaTeXMathFSM()
     
     # Test various inputs
     test_inputs = ["$x^2$", "$\\frac{a}{b}$", "$\\alpha + \\beta$", "$\\sum_{i=1}^n x_i$", "x + y", "$x^$"]
     
+    # Buffer the report and write it out once
+    out = io.StringIO()
     for test_input in test_inputs:
-        print(f"\n📝 Testing: '{test_input}'")
+        print(f"\n📝 Testing: '{test_input}'", file=out)
         fsm.reset()
         
         result = fsm.process_input(test_input)
-        print(f"   Result: {result}")
-        print(f"   Path: {' -> '.join(fsm.path)}")
+        print(f"   Result: {result}", file=out)
+        print(f"   Path: {' -> '.join(fsm.path)}", file=out)
         
         if result:
-            print(f"   ✅ Valid LaTeX expression")
+            print(f"   ✅ Valid LaTeX expression", file=out)
         else:
-            print(f"   ❌ Invalid LaTeX expression")
+            print(f"   ❌ Invalid LaTeX expression", file=out)
+    sys.stdout.write(out.getvalue())
 
 
-def demo_with_llm():
+def demo_with_llm(fsm: Optional[LaTeXMathFSM] = None):
     """Demonstrate with LLM generation."""
     print("\n🤖 LLM Generation Demo")
     print("-" * 25)
@@ -78,7 +84,8 @@ def demo_with_llm():
         print("💡 Try setting GROQ_API_KEY or installing: pip install torch transformers accelerate")
         return
         
-    fsm = LaTeXMathFSM()
+    if fsm is None:
+        fsm = LaTeXMathFSM()
     
     # Test prompts
     prompts = [
@@ -114,8 +121,10 @@ def demo_with_llm():
 def main():
     """Main function."""
     print_banner()
-    demo_latex_fsm()
-    demo_with_llm()
+    # One FSM shared by both demos; each run resets it
+    fsm = LaTeXMathFSM()
+    demo_latex_fsm(fsm)
+    demo_with_llm(fsm)
 
 
 if __name__ == "__main__":
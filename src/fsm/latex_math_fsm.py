@@ -20,15 +20,29 @@ States:
 - end_state: Valid complete expression
 """
 
-from typing import List, Dict, Set
+from typing import Callable, List, Dict, Set, Tuple, FrozenSet, Iterator, Optional
 import re
+from functools import lru_cache
+from types import MappingProxyType
+
+
+# Commands (\name), a backslash plus any single character, a lone trailing
+# backslash, the $$ delimiter, or any other non-whitespace character.
+# Whitespace is skipped by findall.
+_TOKEN_RE = re.compile(r"\\(?:[^\W\d_]+|.)?|\$\$|\S", re.DOTALL)
+
+
+@lru_cache(maxsize=4096)
+def _is_valid_cached(fsm_class: type, latex_str: str) -> bool:
+    """Validate latex_str on a fresh FSM; the walk is deterministic, so results are memoized."""
+    return fsm_class(record_path=False).process_input(latex_str)
 
 
 class LaTeXMathFSM:
     """Finite State Machine for LaTeX mathematical expressions."""
     
     # Valid LaTeX math commands
-    VALID_COMMANDS = {
+    VALID_COMMANDS = frozenset({
         # Basic math operations
         "frac", "sqrt", "sum", "int", "lim", "prod",
         
@@ -74,18 +88,41 @@ class LaTeXMathFSM:
         # Special symbols
         "infty", "nabla", "partial", "emptyset", "exists", "forall",
         "therefore", "because", "dots", "ldots", "cdots", "vdots", "ddots"
-    }
+    })
     
     # Valid brackets and delimiters
-    VALID_DELIMITERS = {
+    VALID_DELIMITERS = frozenset({
         "(", ")", "[", "]", "{", "}", "|", "\\|", "\\{", "\\}",
         "\\langle", "\\rangle", "\\lceil", "\\rceil", "\\lfloor", "\\rfloor"
-    }
+    })
     
     # Valid single characters
-    VALID_NUMBERS = set("0123456789")
-    VALID_VARIABLES = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
-    VALID_OPERATORS = {"+", "-", "=", "<", ">", "*", "/", "!", "?", ".", ",", ";", ":", "'"}
+    VALID_NUMBERS = frozenset("0123456789")
+    VALID_VARIABLES = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    VALID_OPERATORS = frozenset({"+", "-", "=", "<", ">", "*", "/", "!", "?", ".", ",", ";", ":", "'"})
+    
+    # Short-hand commands rewritten to their canonical spelling by tokenize
+    # (read-only: the memoized is_valid results depend on it)
+    COMMAND_ALIASES = MappingProxyType({
+        "\\ge": "\\geq", "\\le": "\\leq", "\\ne": "\\neq",
+        "\\to": "\\rightarrow", "\\gets": "\\leftarrow",
+        "\\implies": "\\Rightarrow", "\\iff": "\\Leftrightarrow",
+        "\\dotsc": "\\ldots", "\\dotsb": "\\cdots",
+    })
+    
+    # Token forms of the tables above for get_valid_*; derived per class by
+    # _build_token_tables so subclass vocabularies are honoured
+    _COMMAND_TOKENS: Tuple[str, ...]
+    _VARIABLE_TOKENS: Tuple[str, ...]
+    _NUMBER_TOKENS: Tuple[str, ...]
+    _OPERATOR_TOKENS: Tuple[str, ...]
+    _DELIMITER_TOKENS: Tuple[str, ...]
+    
+    # Single tokens accepted directly after ^ or _, and single-character
+    # tokens accepted as plain content in math mode or braces; derived per
+    # class by _build_token_tables
+    SCRIPT_ATOMS: FrozenSet[str]
+    CONTENT_ATOMS: FrozenSet[str]
     
     # Math mode delimiters
     MATH_DELIMITERS = {
@@ -95,70 +132,91 @@ class LaTeXMathFSM:
         "align": {"\\begin{align}": "\\end{align}"}
     }
     
-    def __init__(self):
-        """Initialize the FSM."""
+    # Flattened opening/closing delimiters for O(1) membership checks
+    MATH_DELIMITER_TOKENS = frozenset(
+        token
+        for delims in MATH_DELIMITERS.values()
+        for pair in delims.items()
+        for token in pair
+    )
+    
+    # Tokens that close math mode, keyed by math_mode_type
+    MATH_MODE_END_TOKENS = {
+        "inline": frozenset({"$"}),
+        "display": frozenset({"$$", "\\]"}),
+    }
+    
+    # Fixed per-instance layout: no __dict__, faster attribute access
+    __slots__ = (
+        "state", "current_expression", "path", "brace_depth", "bracket_depth",
+        "paren_depth", "math_mode_type", "command_buffer", "environment_stack",
+        "record_path",
+    )
+    
+    # Valid next tokens keyed by (class, state, math_mode_type)
+    _possibilities_cache: Dict[tuple, Tuple[Tuple[str, ...], FrozenSet[str]]] = {}
+    
+    def __init_subclass__(cls, **kwargs) -> None:
+        """Re-derive the token and dispatch tables for the subclass."""
+        super().__init_subclass__(**kwargs)
+        cls._build_token_tables()
+        cls._build_dispatch_table()
+    
+    @classmethod
+    def _build_token_tables(cls) -> None:
+        """Build the token tuples and atom sets from this class's VALID_* sets."""
+        cls._COMMAND_TOKENS = tuple(f"\\{cmd}" for cmd in cls.VALID_COMMANDS)
+        cls._VARIABLE_TOKENS = tuple(cls.VALID_VARIABLES)
+        cls._NUMBER_TOKENS = tuple(cls.VALID_NUMBERS)
+        cls._OPERATOR_TOKENS = tuple(cls.VALID_OPERATORS)
+        cls._DELIMITER_TOKENS = tuple(cls.VALID_DELIMITERS)
+        cls.SCRIPT_ATOMS = frozenset(cls.VALID_VARIABLES) | frozenset(cls.VALID_NUMBERS)
+        cls.CONTENT_ATOMS = cls.SCRIPT_ATOMS | frozenset(cls.VALID_OPERATORS)
+    
+    @classmethod
+    def _build_dispatch_table(cls) -> None:
+        """Resolve _STATE_HANDLERS method names against this class."""
+        cls._STATE_DISPATCH = {
+            state: getattr(cls, name) for state, name in cls._STATE_HANDLERS.items()
+        }
+    
+    def __init__(self, record_path: bool = True) -> None:
+        """Initialize the FSM.
+        
+        Args:
+            record_path: Keep the visited-state history in ``path``. Pure
+                validation can pass False to skip the per-step appends.
+        """
+        self.record_path = record_path
+        self.path: List[str] = []
+        self.environment_stack: List[str] = []
         self.reset()
     
-    def reset(self):
+    def reset(self) -> None:
         """Reset FSM to initial state."""
-        self.state = "start"
-        self.current_expression = ""
-        self.path = ["start"]
-        self.brace_depth = 0
-        self.bracket_depth = 0
-        self.paren_depth = 0
-        self.math_mode_type = None
-        self.command_buffer = ""
-        self.environment_stack = []
+        self.state: str = "start"
+        self.current_expression: str = ""
+        # Reuse the list objects; reset runs once per validated input
+        self.path.clear()
+        self.path.append("start")
+        self.brace_depth: int = 0
+        self.bracket_depth: int = 0
+        self.paren_depth: int = 0
+        self.math_mode_type: Optional[str] = None
+        self.command_buffer: str = ""
+        self.environment_stack.clear()
         
     def tokenize(self, latex_str: str) -> List[str]:
-        """Tokenize LaTeX string into meaningful tokens."""
-        tokens = []
-        i = 0
-        
-        while i < len(latex_str):
-            char = latex_str[i]
-            
-            # Skip whitespace
-            if char.isspace():
-                i += 1
-                continue
-            
-            # Handle backslash commands
-            if char == '\\':
-                # Look ahead for command
-                j = i + 1
-                if j < len(latex_str) and latex_str[j].isalpha():
-                    # Read command name
-                    while j < len(latex_str) and latex_str[j].isalpha():
-                        j += 1
-                    tokens.append(latex_str[i:j])
-                    i = j
-                elif j < len(latex_str):
-                    # Single character after backslash
-                    tokens.append(latex_str[i:j+1])
-                    i = j + 1
-                else:
-                    tokens.append(char)
-                    i += 1
-            
-            # Handle multi-character delimiters
-            elif char == '$' and i + 1 < len(latex_str) and latex_str[i + 1] == '$':
-                tokens.append("$$")
-                i += 2
-            elif char == '\\' and i + 1 < len(latex_str) and latex_str[i + 1] == '[':
-                tokens.append("\\[")
-                i += 2
-            elif char == '\\' and i + 1 < len(latex_str) and latex_str[i + 1] == ']':
-                tokens.append("\\]")
-                i += 2
-            
-            # Single characters
-            else:
-                tokens.append(char)
-                i += 1
-        
-        return tokens
+        """Tokenize LaTeX string into meaningful tokens, canonicalizing aliases."""
+        aliases = self.COMMAND_ALIASES
+        return [aliases.get(token, token) for token in _TOKEN_RE.findall(latex_str)]
+    
+    def iter_tokens(self, latex_str: str) -> Iterator[str]:
+        """Yield tokens lazily, without materializing the token list."""
+        aliases = self.COMMAND_ALIASES
+        for match in _TOKEN_RE.finditer(latex_str):
+            token = match.group()
+            yield aliases.get(token, token)
     
     def is_valid_command(self, command: str) -> bool:
         """Check if command is valid (without backslash)."""
@@ -166,53 +224,34 @@ class LaTeXMathFSM:
     
     def is_math_delimiter(self, token: str) -> bool:
         """Check if token is a math mode delimiter."""
-        for delim_type, delims in self.MATH_DELIMITERS.items():
-            if token in delims.keys() or token in delims.values():
-                return True
-        return False
+        return token in self.MATH_DELIMITER_TOKENS
     
     def get_valid_commands(self) -> List[str]:
         """Get list of valid commands with backslash prefix."""
-        return [f"\\{cmd}" for cmd in self.VALID_COMMANDS]
+        return list(self._COMMAND_TOKENS)
     
     def get_valid_variables(self) -> List[str]:
         """Get valid single variable characters."""
-        return list(self.VALID_VARIABLES)
+        return list(self._VARIABLE_TOKENS)
     
     def get_valid_numbers(self) -> List[str]:
         """Get valid single digit characters."""
-        return list(self.VALID_NUMBERS)
+        return list(self._NUMBER_TOKENS)
     
     def get_valid_operators(self) -> List[str]:
         """Get valid operator characters."""
-        return list(self.VALID_OPERATORS)
+        return list(self._OPERATOR_TOKENS)
     
     def get_valid_delimiters(self) -> List[str]:
         """Get valid delimiter tokens."""
-        return list(self.VALID_DELIMITERS)
+        return list(self._DELIMITER_TOKENS)
     
     def process_token(self, token: str) -> bool:
         """Process a single token through the FSM."""
-        if self.state == "start":
-            return self._process_start_state(token)
-        elif self.state == "math_mode":
-            return self._process_math_mode(token)
-        elif self.state == "command":
-            return self._process_command_state(token)
-        elif self.state == "brace_open":
-            return self._process_brace_open_state(token)
-        elif self.state == "content":
-            return self._process_content_state(token)
-        elif self.state == "superscript":
-            return self._process_superscript_state(token)
-        elif self.state == "subscript":
-            return self._process_subscript_state(token)
-        elif self.state == "fraction_num":
-            return self._process_fraction_num_state(token)
-        elif self.state == "fraction_den":
-            return self._process_fraction_den_state(token)
-        else:
+        handler = self._STATE_DISPATCH.get(self.state)
+        if handler is None:
             return False
+        return handler(self, token)
     
     def _process_start_state(self, token: str) -> bool:
         """Process token in start state."""
@@ -258,9 +297,7 @@ class LaTeXMathFSM:
                 return True
         
         # Variables, numbers, operators
-        if (token in self.VALID_VARIABLES or 
-            token in self.VALID_NUMBERS or 
-            token in self.VALID_OPERATORS):
+        if token in self.CONTENT_ATOMS:
             return True
         
         # Superscript and subscript
@@ -338,79 +375,104 @@ class LaTeXMathFSM:
             return True
         else:
             # Allow most content inside braces
-            return (token in self.VALID_VARIABLES or 
-                   token in self.VALID_NUMBERS or 
-                   token in self.VALID_OPERATORS or
-                   token.startswith("\\"))
+            return token in self.CONTENT_ATOMS or token.startswith("\\")
     
-    def _process_superscript_state(self, token: str) -> bool:
-        """Process token in superscript state."""
+    def _process_script_state(self, token: str) -> bool:
+        """Process token after ^ or _ (superscript and subscript states)."""
         if token == "{":
             self.brace_depth += 1
             self.state = "content"
             self._add_to_path("content")
             return True
-        elif (token in self.VALID_VARIABLES or 
-              token in self.VALID_NUMBERS):
+        elif token in self.SCRIPT_ATOMS:
             self.state = "math_mode"
             self._add_to_path("math_mode")
             return True
         return False
     
-    def _process_subscript_state(self, token: str) -> bool:
-        """Process token in subscript state."""
+    def _process_fraction_part_state(self, token: str) -> bool:
+        """Process token in fraction numerator or denominator state."""
         if token == "{":
             self.brace_depth += 1
             self.state = "content"
             self._add_to_path("content")
             return True
-        elif (token in self.VALID_VARIABLES or 
-              token in self.VALID_NUMBERS):
-            self.state = "math_mode"
-            self._add_to_path("math_mode")
-            return True
         return False
     
-    def _process_fraction_num_state(self, token: str) -> bool:
-        """Process token in fraction numerator state."""
-        if token == "{":
-            self.brace_depth += 1
-            self.state = "content"
-            self._add_to_path("content")
-            return True
-        return False
+    # State name -> handler method name. New states are registered here;
+    # _build_dispatch_table resolves the names per class, so subclasses can
+    # override individual handlers or add entries
+    _STATE_HANDLERS: Dict[str, str] = {
+        "start": "_process_start_state",
+        "math_mode": "_process_math_mode",
+        "command": "_process_command_state",
+        "brace_open": "_process_brace_open_state",
+        "content": "_process_content_state",
+        "superscript": "_process_script_state",
+        "subscript": "_process_script_state",
+        "fraction_num": "_process_fraction_part_state",
+        "fraction_den": "_process_fraction_part_state",
+    }
     
-    def _process_fraction_den_state(self, token: str) -> bool:
-        """Process token in fraction denominator state."""
-        if token == "{":
-            self.brace_depth += 1
-            self.state = "content"
-            self._add_to_path("content")
-            return True
-        return False
+    # State name -> resolved handler function, looked up once per token
+    _STATE_DISPATCH: Dict[str, Callable[["LaTeXMathFSM", str], bool]]
     
     def _is_math_mode_end(self, token: str) -> bool:
         """Check if token ends current math mode."""
-        if self.math_mode_type == "inline" and token == "$":
-            return True
-        elif self.math_mode_type == "display" and token in ["$$", "\\]"]:
-            return True
-        return False
+        end_tokens = self.MATH_MODE_END_TOKENS.get(self.math_mode_type)
+        return end_tokens is not None and token in end_tokens
     
-    def _add_to_path(self, state: str):
+    def _add_to_path(self, state: str) -> None:
         """Add state to path history."""
-        self.path.append(state)
+        if self.record_path:
+            self.path.append(state)
     
     def process_input(self, latex_str: str) -> bool:
-        """Process complete LaTeX string."""
-        tokens = self.tokenize(latex_str)
-        
-        for token in tokens:
+        """Process complete LaTeX string, stopping at the first rejected token."""
+        for token in self.iter_tokens(latex_str):
             if not self.process_token(token):
                 return False
         
         return self.is_complete()
     
+    @classmethod
+    def is_valid(cls, latex_str: str) -> bool:
+        """Check whether a complete LaTeX string is valid, reusing earlier results."""
+        return _is_valid_cached(cls, latex_str)
+    
+    def validate_all(self, expressions: List[str]) -> List[bool]:
+        """Validate several complete LaTeX strings, resetting between each."""
+        reset = self.reset
+        process_input = self.process_input
+        results = []
+        for expr in expressions:
+            reset()
+            results.append(process_input(expr))
+        return results
+    
+    def fast_forward(self, max_tokens: Optional[int] = None) -> str:
+        """Consume tokens while the current state allows exactly one.
+        
+        Stops after ``max_tokens`` forced tokens when given, and as soon as a
+        forced token leaves the state and math mode unchanged: the
+        possibilities depend only on those, so the same single token would be
+        forced again forever.
+        
+        Returns the concatenated forced tokens (empty if none were forced).
+        """
+        forced = []
+        while max_tokens is None or len(forced) < max_tokens:
+            possibilities = self._lookup_possibilities()[0]
+            if len(possibilities) != 1:
+                break
+            before = (self.state, self.math_mode_type)
+            if not self.process_token(possibilities[0]):
+                break
+            forced.append(possibilities[0])
+            if (self.state, self.math_mode_type) == before:
+                break
+        return "".join(forced)
+    
     def is_complete(self) -> bool:
         """Check if FSM is in a valid final state."""
         return (self.state == "end_state" and 
@@ -420,6 +482,25 @@ class LaTeXMathFSM:
     
     def get_current_possibilities(self) -> List[str]:
         """Get valid next tokens based on current state."""
+        return list(self._lookup_possibilities()[0])
+    
+    def get_current_possibility_set(self) -> FrozenSet[str]:
+        """Get valid next tokens as a frozenset for O(1) membership tests."""
+        return self._lookup_possibilities()[1]
+    
+    def _lookup_possibilities(self) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+        """Return the cached (ordered, set) views of the valid next tokens."""
+        # The result depends only on the grammar, the state and the math mode
+        key = (type(self), self.state, self.math_mode_type)
+        entry = self._possibilities_cache.get(key)
+        if entry is None:
+            ordered = tuple(self._compute_possibilities())
+            entry = (ordered, frozenset(ordered))
+            self._possibilities_cache[key] = entry
+        return entry
+    
+    def _compute_possibilities(self) -> List[str]:
+        """Build the list of valid next tokens for the current state."""
         possibilities = []
         
         if self.state == "start":
@@ -465,7 +546,7 @@ class LaTeXMathFSM:
         """Get current state information."""
         return {
             "state": self.state,
-            "path": self.path,
+            "path": list(self.path),
             "brace_depth": self.brace_depth,
             "bracket_depth": self.bracket_depth,
             "paren_depth": self.paren_depth,
@@ -473,3 +554,7 @@ class LaTeXMathFSM:
             "is_complete": self.is_complete(),
             "valid_next_tokens": self.get_current_possibilities()[:10]  # Limit for readability
         }
+
+
+LaTeXMathFSM._build_token_tables()
+LaTeXMathFSM._build_dispatch_table()
@@ -0,0 +1,25 @@
+"""
+Shared constants for LaTeX generation.
+======================================
+
+Values used by more than one of the LLM clients and the Streamlit app, kept
+in one place so the copies cannot drift apart.
+"""
+
+import re
+
+# Characters that mark an expression as having real content worth closing
+CONTENT_CHARS = frozenset("xyzabc123")
+
+# Preferred tokens per state, tried in order by the token chooser
+START_PREFERENCES = ("$",)
+MATH_MODE_PREFERENCES = ("x", "y", "z", "a", "b", "1", "2", "+")
+SCRIPT_PREFERENCES = ("2", "i", "n", "1", "{")
+CONTENT_PREFERENCES = ("a", "b", "x", "y", "1", "2", "}")
+
+# Patterns used to pull a math expression out of raw model output
+INLINE_MATH_RE = re.compile(r'\$([^$]+)\$')
+DISPLAY_MATH_RE = re.compile(r'\$\$([^$]+)\$\$')
+INCOMPLETE_MATH_RE = re.compile(r'\$\$?\s*([^$]*(?:\\\w+[^$]*)*)')
+MATH_CONTENT_RE = re.compile(r'[a-zA-Z]|\\\w+|\d|[+\-*/^_{}()]')
+TRAILING_JUNK_RE = re.compile(r'[^a-zA-Z0-9+\-*/^_{}()\\\s]*$')
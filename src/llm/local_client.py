@@ -5,9 +5,8 @@ Local Gemma Client for LaTeX Math FSM-constrained generation.
 A client that uses local Hugging Face Transformers models to generate valid LaTeX mathematical expressions token-by-token.
 """
 
-import re
 import torch
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, FrozenSet
 import warnings
 
 try:
@@ -19,6 +18,12 @@ except ImportError:
     GenerationConfig = None
     TRANSFORMERS_AVAILABLE = False
 
+from .constants import (
+    CONTENT_CHARS, START_PREFERENCES, MATH_MODE_PREFERENCES,
+    SCRIPT_PREFERENCES, CONTENT_PREFERENCES, INLINE_MATH_RE, DISPLAY_MATH_RE,
+    INCOMPLETE_MATH_RE, MATH_CONTENT_RE, TRAILING_JUNK_RE,
+)
+
 
 class LocalGemmaClient:
     """Local Gemma client for FSM-constrained generation using Hugging Face Transformers."""
@@ -211,7 +216,7 @@ Expression:"""
         text = text.strip()
         
         # Try inline math first: $...$
-        inline_matches = re.findall(r'\$([^$]+)\$', text)
+        inline_matches = INLINE_MATH_RE.findall(text)
         if inline_matches:
             # Take the first complete match
             expr = inline_matches[0].strip()
@@ -219,18 +224,18 @@ Expression:"""
                 return f"${expr}$"
         
         # Try display math: $$...$$
-        display_matches = re.findall(r'\$\$([^$]+)\$\$', text)
+        display_matches = DISPLAY_MATH_RE.findall(text)
         if display_matches:
             expr = display_matches[0].strip()
             if expr:
                 return f"${expr}$"  # Convert to inline math
         
         # Try to find incomplete expressions and fix them
-        incomplete_matches = re.findall(r'\$\$?\s*([^$]*(?:\\\w+[^$]*)*)', text)
+        incomplete_matches = INCOMPLETE_MATH_RE.findall(text)
         if incomplete_matches:
             expr = incomplete_matches[0].strip()
             # If it looks like a math expression, wrap it
-            if re.search(r'[a-zA-Z]|\\\w+|\d|[+\-*/^_{}()]', expr):
+            if MATH_CONTENT_RE.search(expr):
                 return f"${expr}$"
         
         # If text starts with $ but is incomplete, try to extract what we can
@@ -238,7 +243,7 @@ Expression:"""
             # Extract everything after the first $
             remaining = text[1:].strip()
             # Remove any trailing incomplete parts
-            remaining = re.sub(r'[^a-zA-Z0-9+\-*/^_{}()\\\s]*$', '', remaining)
+            remaining = TRAILING_JUNK_RE.sub('', remaining)
             if remaining and len(remaining) > 0:
                 return f"${remaining}$"
         
@@ -297,6 +302,7 @@ Expression:"""
         fsm.reset()
         result_expr = ""
         max_tokens = 20
+        prompt_lower = prompt.lower()
         
         for position in range(max_tokens):
             # Get valid possibilities from FSM
@@ -312,7 +318,10 @@ Expression:"""
                 print(f"   Available tokens: {possibilities[:10]}{'...' if len(possibilities) > 10 else ''}")
             
             # Choose token based on prompt content and FSM state
-            chosen_token = self._choose_latex_token(prompt, possibilities, fsm.state, result_expr, verbose)
+            chosen_token = self._choose_latex_token(
+                prompt_lower, possibilities, fsm.get_current_possibility_set(),
+                fsm.state, result_expr, verbose
+            )
             
             if chosen_token is None:
                 if verbose:
@@ -326,6 +335,13 @@ Expression:"""
                     print(f"   ✅ FSM accepted '{chosen_token}' -> New state: {fsm.state}")
                     print(f"   Current expression: '{result_expr}'")
                 
+                # Emit tokens the FSM leaves no choice about in one go
+                forced = fsm.fast_forward(max_tokens - position - 1)
+                if forced:
+                    result_expr += forced
+                    if verbose:
+                        print(f"   ⏩ Forced '{forced}' -> New state: {fsm.state}")
+                
                 # Check if we have a complete expression
                 if fsm.is_complete():
                     if verbose:
@@ -351,68 +367,69 @@ Expression:"""
         # Fallback to a simple valid expression
         return "$x$"
     
-    def _choose_latex_token(self, prompt: str, possibilities: list, state: str, current_expr: str, verbose: bool) -> Optional[str]:
-        """Choose the most appropriate LaTeX token based on context."""
-        prompt_lower = prompt.lower()
+    def _choose_latex_token(self, prompt_lower: str, possibilities: list, allowed: FrozenSet[str], state: str, current_expr: str, verbose: bool) -> Optional[str]:
+        """Choose the most appropriate LaTeX token based on context.
         
+        ``prompt_lower`` is the prompt already lowercased by the caller.
+        """
         # End conditions
-        if "$" in possibilities and len(current_expr) > 3:
+        if "$" in allowed and len(current_expr) > 3:
             # Simple heuristic: end after generating some content
-            if any(char in current_expr for char in "xyzabc123"):
+            if not CONTENT_CHARS.isdisjoint(current_expr):
                 if verbose:
                     print(f"   🎯 Chosen: '$' (completing expression)")
                 return "$"
         
         # Content-based choices
-        if "fraction" in prompt_lower and "\\frac" in possibilities:
+        if "fraction" in prompt_lower and "\\frac" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '\\frac' (prompt mentions fraction)")
             return "\\frac"
-        elif "square" in prompt_lower and "^" in possibilities:
+        elif "square" in prompt_lower and "^" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '^' (prompt mentions square)")
             return "^"
-        elif "subscript" in prompt_lower and "_" in possibilities:
+        elif "subscript" in prompt_lower and "_" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '_' (prompt mentions subscript)")
             return "_"
-        elif "alpha" in prompt_lower and "\\alpha" in possibilities:
+        elif "alpha" in prompt_lower and "\\alpha" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '\\alpha' (prompt mentions alpha)")
             return "\\alpha"
-        elif "beta" in prompt_lower and "\\beta" in possibilities:
+        elif "beta" in prompt_lower and "\\beta" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '\\beta' (prompt mentions beta)")
             return "\\beta"
         
         # State-based choices
         if state == "start":
-            for token in ["$"]:
-                if token in possibilities:
+            for token in START_PREFERENCES:
+                if token in allowed:
                     if verbose:
                         print(f"   🎯 Chosen: '{token}' (starting math mode)")
                     return token
         elif state == "math_mode":
             # Prefer variables for basic expressions
-            for token in ["x", "y", "z", "a", "b", "1", "2", "+"]:
-                if token in possibilities:
+            for token in MATH_MODE_PREFERENCES:
+                if token in allowed:
                     if verbose:
                         print(f"   🎯 Chosen: '{token}' (basic math content)")
                     return token
-        elif state in ["superscript", "subscript"]:
-            for token in ["2", "i", "n", "1", "{"]:
-                if token in possibilities:
+        elif state in ("superscript", "subscript"):
+            for token in SCRIPT_PREFERENCES:
+                if token in allowed:
                     if verbose:
                         print(f"   🎯 Chosen: '{token}' (simple {state} content)")
                     return token
         elif state == "fraction_num":
-            if "{" in possibilities:
+            if "{" in allowed:
                 if verbose:
                     print(f"   🎯 Chosen: '{{' (opening fraction numerator)")
                 return "{"
         elif state == "content":
-            for token in ["a", "b", "x", "y", "1", "2", "}"]:
-                if token in possibilities:
+            for token in CONTENT_PREFERENCES:
+                if token in allowed:
                     if verbose:
                         print(f"   🎯 Chosen: '{token}' (content inside braces)")
                     return token
@@ -6,8 +6,8 @@ A client that works with LaTeX Math FSMs to generate valid LaTeX mathematical ex
 """
 
 import os
-import re
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, List, Dict, FrozenSet
 
 try:
     from groq import Groq
@@ -16,6 +16,39 @@ except ImportError:
     Groq = None
     GROQ_AVAILABLE = False
 
+from .constants import (
+    CONTENT_CHARS, START_PREFERENCES, MATH_MODE_PREFERENCES,
+    SCRIPT_PREFERENCES, CONTENT_PREFERENCES, INLINE_MATH_RE, DISPLAY_MATH_RE,
+    INCOMPLETE_MATH_RE, MATH_CONTENT_RE, TRAILING_JUNK_RE,
+)
+
+# Fixed instructions for LaTeX generation, sent as the system message. Only
+# the user message changes between requests, so they all share this prefix
+# and the server can reuse its cached prefill
+_LATEX_SYSTEM_PROMPT = """You write simple LaTeX math expressions.
+
+Rules:
+1. Use ONLY inline math format: $expression$
+2. Keep expressions simple and complete
+3. No text, no explanations, ONLY the math expression
+4. Examples: $ax^3 + bx^2 + cx + d$, $\\frac{x}{y}$, $\\alpha^2$"""
+
+
+@lru_cache(maxsize=None)
+def _shared_groq_client(api_key: str) -> "Groq":
+    """Return one Groq SDK client per API key so its HTTP connection pool is reused."""
+    return Groq(api_key=api_key)
+
+
+def _chat_messages(prompt: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+    """Build the chat message list, leading with the system prompt if one is given."""
+    if system_prompt is None:
+        return [{"role": "user", "content": prompt}]
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+
 
 class SimpleGroqClient:
     """Simple Groq client for FSM-constrained generation."""
@@ -29,20 +62,21 @@ class SimpleGroqClient:
         if not self.api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
-        self.client = Groq(api_key=self.api_key)
+        self.client = _shared_groq_client(self.api_key)
         self.default_model = "llama-3.1-8b-instant"
     
     def generate_simple(
         self,
         prompt: str,
         max_tokens: int = 50,
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        system_prompt: Optional[str] = None
     ) -> str:
         """Generate simple text response."""
         try:
             response = self.client.chat.completions.create(
                 model=self.default_model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=_chat_messages(prompt, system_prompt),
                 max_tokens=max_tokens,
                 temperature=temperature
             )
@@ -52,6 +86,40 @@ class SimpleGroqClient:
         except Exception as e:
             raise RuntimeError(f"Failed to generate text: {str(e)}")
 
+    def _generate_until_math(
+        self,
+        prompt: str,
+        max_tokens: int = 50,
+        temperature: float = 0.3,
+        system_prompt: Optional[str] = None
+    ) -> str:
+        """Stream a response and stop reading at the first complete $...$ expression."""
+        try:
+            text = ""
+            # The context manager closes the HTTP response on the early
+            # break and on errors, returning the connection to the shared pool
+            with self.client.chat.completions.create(
+                model=self.default_model,
+                messages=_chat_messages(prompt, system_prompt),
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True
+            ) as stream:
+                for chunk in stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    text += chunk.choices[0].delta.content
+                    # extract_latex_expression takes the first inline match, and
+                    # later text cannot change it, so the rest is not needed
+                    match = INLINE_MATH_RE.search(text)
+                    if match and match.group(1).strip():
+                        break
+            
+            return text.strip()
+            
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate text: {str(e)}")
+
     def generate_with_latex_fsm(self, prompt: str, fsm, verbose: bool = True) -> str:
         """Generate LaTeX math expressions constrained by FSM with detailed logging."""
         # Reset FSM
@@ -61,24 +129,17 @@ class SimpleGroqClient:
             print(f"\n🧮 LaTeX Generation Process")
             print(f"📝 Original prompt: {prompt}")
         
-        # Create a prompt that forces simple LaTeX math expression generation
-        latex_prompt = f"""
-Generate a simple LaTeX math expression for: {prompt}
-
-Rules:
-1. Use ONLY inline math format: $expression$
-2. Keep expressions simple and complete
-3. No text, no explanations, ONLY the math expression
-4. Examples: $ax^3 + bx^2 + cx + d$, $\\frac{{x}}{{y}}$, $\\alpha^2$
-
-Expression:"""
+        # Create a prompt that forces simple LaTeX math expression generation;
+        # the fixed rules go in the system message ahead of it
+        latex_prompt = f"Request: {prompt}\n\nExpression:"
         
         if verbose:
             print(f"📋 Enhanced prompt sent to LLM:")
-            print(f"   {latex_prompt.strip()}")
+            print(f"   {_LATEX_SYSTEM_PROMPT}")
+            print(f"   {latex_prompt}")
         
         # Generate response
-        response = self.generate_simple(latex_prompt, max_tokens=30, temperature=0.1)
+        response = self._generate_until_math(latex_prompt, max_tokens=30, temperature=0.1, system_prompt=_LATEX_SYSTEM_PROMPT)
         
         if verbose:
             print(f"\n🎯 Raw LLM Response:")
@@ -117,13 +178,11 @@ Expression:"""
     
     def extract_latex_expression(self, text: str) -> Optional[str]:
         """Extract LaTeX mathematical expression from text."""
-        import re
-        
         # Clean the text first
         text = text.strip()
         
         # Try inline math first: $...$
-        inline_matches = re.findall(r'\$([^$]+)\$', text)
+        inline_matches = INLINE_MATH_RE.findall(text)
         if inline_matches:
             # Take the first complete match
             expr = inline_matches[0].strip()
@@ -131,18 +190,18 @@ Expression:"""
                 return f"${expr}$"
         
         # Try display math: $$...$$
-        display_matches = re.findall(r'\$\$([^$]+)\$\$', text)
+        display_matches = DISPLAY_MATH_RE.findall(text)
         if display_matches:
             expr = display_matches[0].strip()
             if expr:
                 return f"${expr}$"  # Convert to inline math
         
         # Try to find incomplete expressions and fix them
-        incomplete_matches = re.findall(r'\$\$?\s*([^$]*(?:\\\w+[^$]*)*)', text)
+        incomplete_matches = INCOMPLETE_MATH_RE.findall(text)
         if incomplete_matches:
             expr = incomplete_matches[0].strip()
             # If it looks like a math expression, wrap it
-            if re.search(r'[a-zA-Z]|\\\w+|\d|[+\-*/^_{}()]', expr):
+            if MATH_CONTENT_RE.search(expr):
                 return f"${expr}$"
         
         # If text starts with $ but is incomplete, try to extract what we can
@@ -150,7 +209,7 @@ Expression:"""
             # Extract everything after the first $
             remaining = text[1:].strip()
             # Remove any trailing incomplete parts
-            remaining = re.sub(r'[^a-zA-Z0-9+\-*/^_{}()\\\s]*$', '', remaining)
+            remaining = TRAILING_JUNK_RE.sub('', remaining)
             if remaining and len(remaining) > 0:
                 return f"${remaining}$"
         
@@ -209,6 +268,7 @@ Expression:"""
         fsm.reset()
         result_expr = ""
         max_tokens = 20
+        prompt_lower = prompt.lower()
         
         for position in range(max_tokens):
             # Get valid possibilities from FSM
@@ -224,7 +284,10 @@ Expression:"""
                 print(f"   Available tokens: {possibilities[:10]}{'...' if len(possibilities) > 10 else ''}")
             
             # Choose token based on prompt content and FSM state
-            chosen_token = self._choose_latex_token(prompt, possibilities, fsm.state, result_expr, verbose)
+            chosen_token = self._choose_latex_token(
+                prompt_lower, possibilities, fsm.get_current_possibility_set(),
+                fsm.state, result_expr, verbose
+            )
             
             if chosen_token is None:
                 if verbose:
@@ -238,6 +301,13 @@ Expression:"""
                     print(f"   ✅ FSM accepted '{chosen_token}' -> New state: {fsm.state}")
                     print(f"   Current expression: '{result_expr}'")
                 
+                # Emit tokens the FSM leaves no choice about in one go
+                forced = fsm.fast_forward(max_tokens - position - 1)
+                if forced:
+                    result_expr += forced
+                    if verbose:
+                        print(f"   ⏩ Forced '{forced}' -> New state: {fsm.state}")
+                
                 # Check if we have a complete expression
                 if fsm.is_complete():
                     if verbose:
@@ -263,68 +333,69 @@ Expression:"""
         # Fallback to a simple valid expression
         return "$x$"
     
-    def _choose_latex_token(self, prompt: str, possibilities: list, state: str, current_expr: str, verbose: bool) -> Optional[str]:
-        """Choose the most appropriate LaTeX token based on context."""
-        prompt_lower = prompt.lower()
+    def _choose_latex_token(self, prompt_lower: str, possibilities: list, allowed: FrozenSet[str], state: str, current_expr: str, verbose: bool) -> Optional[str]:
+        """Choose the most appropriate LaTeX token based on context.
         
+        ``prompt_lower`` is the prompt already lowercased by the caller.
+        """
         # End conditions
-        if "$" in possibilities and len(current_expr) > 3:
+        if "$" in allowed and len(current_expr) > 3:
             # Simple heuristic: end after generating some content
-            if any(char in current_expr for char in "xyzabc123"):
+            if not CONTENT_CHARS.isdisjoint(current_expr):
                 if verbose:
                     print(f"   🎯 Chosen: '$' (completing expression)")
                 return "$"
         
         # Content-based choices
-        if "fraction" in prompt_lower and "\\frac" in possibilities:
+        if "fraction" in prompt_lower and "\\frac" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '\\frac' (prompt mentions fraction)")
             return "\\frac"
-        elif "square" in prompt_lower and "^" in possibilities:
+        elif "square" in prompt_lower and "^" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '^' (prompt mentions square)")
             return "^"
-        elif "subscript" in prompt_lower and "_" in possibilities:
+        elif "subscript" in prompt_lower and "_" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '_' (prompt mentions subscript)")
             return "_"
-        elif "alpha" in prompt_lower and "\\alpha" in possibilities:
+        elif "alpha" in prompt_lower and "\\alpha" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '\\alpha' (prompt mentions alpha)")
             return "\\alpha"
-        elif "beta" in prompt_lower and "\\beta" in possibilities:
+        elif "beta" in prompt_lower and "\\beta" in allowed:
             if verbose:
                 print(f"   🎯 Chosen: '\\beta' (prompt mentions beta)")
             return "\\beta"
         
         # State-based choices
         if state == "start":
-            for token in ["$"]:
-                if token in possibilities:
+            for token in START_PREFERENCES:
+                if token in allowed:
                     if verbose:
                         print(f"   🎯 Chosen: '{token}' (starting math mode)")
                     return token
         elif state == "math_mode":
             # Prefer variables for basic expressions
-            for token in ["x", "y", "z", "a", "b", "1", "2", "+"]:
-                if token in possibilities:
+            for token in MATH_MODE_PREFERENCES:
+                if token in allowed:
                     if verbose:
                         print(f"   🎯 Chosen: '{token}' (basic math content)")
                     return token
-        elif state in ["superscript", "subscript"]:
-            for token in ["2", "i", "n", "1", "{"]:
-                if token in possibilities:
+        elif state in ("superscript", "subscript"):
+            for token in SCRIPT_PREFERENCES:
+                if token in allowed:
                     if verbose:
                         print(f"   🎯 Chosen: '{token}' (simple {state} content)")
                     return token
         elif state == "fraction_num":
-            if "{" in possibilities:
+            if "{" in allowed:
                 if verbose:
                     print(f"   🎯 Chosen: '{{' (opening fraction numerator)")
                 return "{"
         elif state == "content":
-            for token in ["a", "b", "x", "y", "1", "2", "}"]:
-                if token in possibilities:
+            for token in CONTENT_PREFERENCES:
+                if token in allowed:
                     if verbose:
                         print(f"   🎯 Chosen: '{token}' (content inside braces)")
                     return token
@@ -7,9 +7,13 @@ valid LaTeX mathematical expressions token-by-token with FSM constraints.
 """
 
 import os
+import re
+from importlib.util import find_spec
 from typing import Optional, Dict, Any, Union, TYPE_CHECKING
 from enum import Enum
 
+from .constants import INLINE_MATH_RE, DISPLAY_MATH_RE
+
 if TYPE_CHECKING:
     from .simple_client import SimpleGroqClient
     from .local_client import LocalGemmaClient
@@ -20,11 +24,13 @@ except ImportError:
     SimpleGroqClient = None
     GROQ_AVAILABLE = False
 
-try:
-    from .local_client import LocalGemmaClient, TRANSFORMERS_AVAILABLE
-except ImportError:
-    LocalGemmaClient = None
-    TRANSFORMERS_AVAILABLE = False
+# Probe for the local model stack without importing torch/transformers.
+# A hit only means the packages are installed: LocalGemmaClient (and torch)
+# is imported when a local client is actually built, and that may still fail
+TRANSFORMERS_AVAILABLE = find_spec("torch") is not None and find_spec("transformers") is not None
+
+# Pattern used when the active client has no extract_latex_expression
+_BLOCK_MATH_RE = re.compile(r'\\\\?\[([^\\]+)\\\\?\]')
 
 
 class ModelType(Enum):
@@ -57,6 +63,8 @@ class UnifiedLLMClient:
         self.auto_fallback = auto_fallback
         self.client = None
         self.fallback_client = None
+        # (model_name, device) of a local fallback not loaded yet
+        self._pending_local_fallback = None
         
         print(f"🚀 Initializing Unified LLM Client with {self.model_type.value} model...")
         
@@ -64,18 +72,18 @@ class UnifiedLLMClient:
         if self.model_type == ModelType.GROQ:
             self.client = self._init_groq_client(groq_api_key)
             if auto_fallback and TRANSFORMERS_AVAILABLE:
-                try:
-                    self.fallback_client = self._init_local_client(local_model_name, device)
-                    print("📋 Local model fallback available")
-                except Exception as e:
-                    print(f"⚠️  Local model fallback failed to initialize: {e}")
+                # Loading a local model imports torch and reads the weights,
+                # so defer it until the Groq client actually fails
+                self._pending_local_fallback = (local_model_name, device)
+                print("📋 Local model fallback will be loaded if needed")
         
         elif self.model_type == ModelType.LOCAL_GEMMA:
             self.client = self._init_local_client(local_model_name, device)
             if auto_fallback and GROQ_AVAILABLE:
                 try:
                     self.fallback_client = self._init_groq_client(groq_api_key)
-                    print("📋 Groq API fallback available")
+                    if self.fallback_client is not None:
+                        print("📋 Groq API fallback available")
                 except Exception as e:
                     print(f"⚠️  Groq API fallback failed to initialize: {e}")
         
@@ -87,6 +95,19 @@ class UnifiedLLMClient:
         
         print(f"✅ Unified LLM Client initialized successfully!")
     
+    def _get_fallback_client(self):
+        """Return the fallback client, loading a deferred local fallback on first use."""
+        if self._pending_local_fallback is not None:
+            model_name, device = self._pending_local_fallback
+            self._pending_local_fallback = None
+            try:
+                self.fallback_client = self._init_local_client(model_name, device)
+                if self.fallback_client is not None:
+                    print("📋 Local model fallback loaded")
+            except Exception as e:
+                print(f"⚠️  Local model fallback failed to initialize: {e}")
+        return self.fallback_client
+    
     def _init_groq_client(self, api_key: Optional[str]):
         """Initialize Groq client."""
         if not GROQ_AVAILABLE:
@@ -106,6 +127,7 @@ class UnifiedLLMClient:
             return None
         
         try:
+            from .local_client import LocalGemmaClient
             return LocalGemmaClient(model_name=model_name, device=device)
         except Exception as e:
             print(f"❌ Failed to initialize local client: {e}")
@@ -123,7 +145,7 @@ class UnifiedLLMClient:
         except Exception as e:
             print(f"⚠️  Primary client failed: {e}")
             
-            if self.auto_fallback and self.fallback_client:
+            if self.auto_fallback and self._get_fallback_client():
                 print(f"🔄 Attempting fallback...")
                 try:
                     return self.fallback_client.generate_simple(prompt, max_tokens, temperature)
@@ -147,7 +169,7 @@ class UnifiedLLMClient:
             if verbose:
                 print(f"⚠️  {client_name} failed: {e}")
             
-            if self.auto_fallback and self.fallback_client:
+            if self.auto_fallback and self._get_fallback_client():
                 fallback_name = "Groq API" if self.model_type == ModelType.LOCAL_GEMMA else "local model"
                 
                 if verbose:
@@ -169,22 +191,20 @@ class UnifiedLLMClient:
             return self.client.extract_latex_expression(text)
         
         # Fallback to manual extraction if client doesn't have the method
-        import re
-        
         # Try inline math first: $...$
-        inline_matches = re.findall(r'\$([^$]+)\$', text)
-        if inline_matches:
-            return f"${inline_matches[0]}$"
+        inline_match = INLINE_MATH_RE.search(text)
+        if inline_match:
+            return f"${inline_match.group(1)}$"
         
         # Try display math: $$...$$
-        display_matches = re.findall(r'\$\$([^$]+)\$\$', text)
-        if display_matches:
-            return f"$${display_matches[0]}$$"
+        display_match = DISPLAY_MATH_RE.search(text)
+        if display_match:
+            return f"$${display_match.group(1)}$$"
         
         # Try LaTeX blocks: \[...\]
-        block_matches = re.findall(r'\\\\?\[([^\\]+)\\\\?\]', text)
-        if block_matches:
-            return f"\\[{block_matches[0]}\\]"
+        block_match = _BLOCK_MATH_RE.search(text)
+        if block_match:
+            return f"\\[{block_match.group(1)}\\]"
         
         return None
     
@@ -193,7 +213,7 @@ class UnifiedLLMClient:
         info = {
             "primary_model_type": self.model_type.value,
             "auto_fallback": self.auto_fallback,
-            "fallback_available": self.fallback_client is not None
+            "fallback_available": self.fallback_client is not None or self._pending_local_fallback is not None
         }
         
         # Add primary client info
@@ -214,6 +234,12 @@ class UnifiedLLMClient:
                     "model_name": self.fallback_client.default_model,
                     "model_type": "groq_api"
                 }
+        elif self._pending_local_fallback is not None:
+            info["fallback_model"] = {
+                "model_name": self._pending_local_fallback[0],
+                "model_type": "local_transformers",
+                "loaded": False
+            }
         
         return info
     
@@ -242,7 +268,7 @@ class UnifiedLLMClient:
             return False
         
         # If we have a fallback client of the requested type, switch to it
-        if self.fallback_client:
+        if self._get_fallback_client():
             if ((new_type == ModelType.GROQ and hasattr(self.fallback_client, 'default_model')) or
                 (new_type == ModelType.LOCAL_GEMMA and hasattr(self.fallback_client, 'model_name'))):
                 
@@ -18,7 +18,7 @@ import streamlit as st
 import sys
 from pathlib import Path
 import os
-from typing import List, Dict, Optional
+from typing import List, Dict, FrozenSet, Optional
 import re
 from dotenv import load_dotenv
 
@@ -30,6 +30,7 @@ sys.path.append(str(Path(__file__).parent / "src"))
 
 from src.fsm import LaTeXMathFSM
 from src.llm.unified_client import UnifiedLLMClient, ModelType, create_auto_client
+from src.llm.constants import CONTENT_CHARS
 
 # Import FSM visualizer components
 try:
@@ -46,6 +47,9 @@ try:
 except ImportError:
     VISUALIZER_AVAILABLE = False
 
+# Variables the token chooser looks for before adding operators
+_VARIABLE_CHARS = frozenset("xyzab")
+
 # Page configuration
 st.set_page_config(
     page_title="LaTeX Math FSM",
@@ -522,14 +526,14 @@ def generate_latex_expression(prompt: str, verbose: bool, max_attempts: int):
     progress_bar = st.progress(0)
     status_text = st.empty()
     
+    # One FSM for all attempts; the generators reset it before use
+    fsm = LaTeXMathFSM()
+    
     for attempt in range(max_attempts):
         progress_bar.progress((attempt + 1) / max_attempts)
         status_text.text(f"Generation attempt {attempt + 1}/{max_attempts}...")
         
         try:
-            # Reset FSM for each attempt
-            fsm = LaTeXMathFSM()
-            
             if verbose:
                 st.markdown(f"**Attempt {attempt + 1}:**")
                 
@@ -554,9 +558,8 @@ def generate_latex_expression(prompt: str, verbose: bool, max_attempts: int):
                                unsafe_allow_html=True)
                 
                 with col2:
-                    # Verify with FSM
-                    test_fsm = LaTeXMathFSM()
-                    is_valid = test_fsm.process_input(result)
+                    # Verify with FSM (memoized across Streamlit reruns)
+                    is_valid = LaTeXMathFSM.is_valid(result)
                     
                     if is_valid:
                         st.markdown('<div class="success-box">✅ FSM Validated</div>', 
@@ -625,7 +628,9 @@ def generate_with_detailed_fsm_steps(prompt: str, fsm):
                     break
             
             # Choose token with improved logic
-            chosen_token = choose_token_for_prompt(prompt, valid_tokens, fsm.state, result_expr, step)
+            chosen_token = choose_token_for_prompt(
+                prompt, valid_tokens, fsm.get_current_possibility_set(), fsm.state, result_expr, step
+            )
             
             with col3:
                 if chosen_token:
@@ -661,8 +666,11 @@ def generate_with_detailed_fsm_steps(prompt: str, fsm):
             st.info(f"Generated incomplete expression: `{result_expr}`. Using simple fallback.")
             return "$x$"
 
-def choose_token_for_prompt(prompt: str, valid_tokens: list, current_state: str, current_expr: str, step: int = 0) -> str:
-    """Choose the most appropriate token based on prompt and FSM state with more reliable selection."""
+def choose_token_for_prompt(prompt: str, valid_tokens: list, allowed: FrozenSet[str], current_state: str, current_expr: str, step: int = 0) -> str:
+    """Choose the most appropriate token based on prompt and FSM state with more reliable selection.
+    
+    ``allowed`` is the FSM's cached set of the same ``valid_tokens``, used for membership checks.
+    """
     import random
     
     if not valid_tokens:
@@ -671,9 +679,9 @@ def choose_token_for_prompt(prompt: str, valid_tokens: list, current_state: str,
     prompt_lower = prompt.lower()
     
     # Ensure we end the expression properly
-    if "$" in valid_tokens and len(current_expr) > 4:
+    if "$" in allowed and len(current_expr) > 4:
         # End if we have meaningful content and we're in math_mode
-        if current_state == "math_mode" and any(char in current_expr for char in "xyzabc123"):
+        if current_state == "math_mode" and not CONTENT_CHARS.isdisjoint(current_expr):
             # End after step 6 or if expression is getting long
             if step >= 6 or len(current_expr) > 8:
                 return "$"
@@ -681,26 +689,26 @@ def choose_token_for_prompt(prompt: str, valid_tokens: list, current_state: str,
     # State-specific reliable logic
     if current_state == "start":
         # Always start with math mode delimiter
-        return "$" if "$" in valid_tokens else valid_tokens[0]
+        return "$" if "$" in allowed else valid_tokens[0]
     
     elif current_state == "math_mode":
         # Early steps - build main content
         if step <= 2:
             # Content-based selection with prompt analysis
-            if "fraction" in prompt_lower and "\\frac" in valid_tokens:
+            if "fraction" in prompt_lower and "\\frac" in allowed:
                 return "\\frac"
-            elif "sum" in prompt_lower and "\\sum" in valid_tokens:
+            elif "sum" in prompt_lower and "\\sum" in allowed:
                 return "\\sum"
-            elif "alpha" in prompt_lower and "\\alpha" in valid_tokens:
+            elif "alpha" in prompt_lower and "\\alpha" in allowed:
                 return "\\alpha"
-            elif "beta" in prompt_lower and "\\beta" in valid_tokens:
+            elif "beta" in prompt_lower and "\\beta" in allowed:
                 return "\\beta"
-            elif "integral" in prompt_lower and "\\int" in valid_tokens:
+            elif "integral" in prompt_lower and "\\int" in allowed:
                 return "\\int"
             
             # Variable selection - prefer x for equations
             variables = ["x", "y", "z", "a", "b"]
-            available_vars = [var for var in variables if var in valid_tokens]
+            available_vars = [var for var in variables if var in allowed]
             if available_vars:
                 if "equation" in prompt_lower and "x" in available_vars:
                     return "x"
@@ -710,53 +718,53 @@ def choose_token_for_prompt(prompt: str, valid_tokens: list, current_state: str,
         # Middle steps - add operations
         elif step <= 4:
             # If we have a variable, consider operations
-            if any(var in current_expr for var in ["x", "y", "z", "a", "b"]):
+            if not _VARIABLE_CHARS.isdisjoint(current_expr):
                 if "quadratic" in prompt_lower or "square" in prompt_lower:
-                    if "^" in valid_tokens and "^" not in current_expr:
+                    if "^" in allowed and "^" not in current_expr:
                         return "^"
                 
                 # Add operators occasionally
                 operators = ["+", "-", "="]
-                available_ops = [op for op in operators if op in valid_tokens]
+                available_ops = [op for op in operators if op in allowed]
                 if available_ops and random.random() < 0.4:
                     return available_ops[0]
             
             # Add numbers or more variables
             numbers = ["1", "2", "3"]
-            available_nums = [num for num in numbers if num in valid_tokens]
+            available_nums = [num for num in numbers if num in allowed]
             if available_nums:
                 return available_nums[0]
         
         # Later steps - try to end
         else:
-            if "$" in valid_tokens:
+            if "$" in allowed:
                 return "$"
     
     elif current_state in ["superscript", "subscript"]:
         # Handle superscripts/subscripts simply
-        if "2" in valid_tokens and ("square" in prompt_lower or "quadratic" in prompt_lower):
+        if "2" in allowed and ("square" in prompt_lower or "quadratic" in prompt_lower):
             return "2"
         
         # Simple superscript/subscript tokens
         simple_tokens = ["2", "1", "n", "i", "{"]
-        available = [token for token in simple_tokens if token in valid_tokens]
+        available = [token for token in simple_tokens if token in allowed]
         if available:
             return available[0]
     
     elif current_state == "fraction_num":
         # Always open brace for fraction numerator
-        return "{" if "{" in valid_tokens else valid_tokens[0]
+        return "{" if "{" in allowed else valid_tokens[0]
     
     elif current_state == "content":
         # Inside braces - add simple content then close
-        if "}" in valid_tokens and len([c for c in current_expr if c == "}"]) < len([c for c in current_expr if c == "{"]):
+        if "}" in allowed and current_expr.count("}") < current_expr.count("{"):
             # We have unclosed braces, sometimes close them
             if random.random() < 0.7:  # 70% chance to close
                 return "}"
         
         # Add simple content
         simple_content = ["a", "b", "x", "y", "1", "2"]
-        available = [token for token in simple_content if token in valid_tokens]
+        available = [token for token in simple_content if token in allowed]
         if available:
             return available[0]
     
@@ -764,7 +772,7 @@ def choose_token_for_prompt(prompt: str, valid_tokens: list, current_state: str,
     # Prefer meaningful tokens over punctuation
     priority_tokens = ["x", "y", "a", "b", "1", "2", "$", "}", "+", "-"]
     for token in priority_tokens:
-        if token in valid_tokens:
+        if token in allowed:
             return token
     
     # Last resort - first available token
@@ -834,8 +842,7 @@ def render_fsm_visualizer():
                         all_possibilities = []
                         
                         for token in tokens:
-                            possibilities = fsm.get_current_possibilities()
-                            all_possibilities.append(possibilities.copy())
+                            all_possibilities.append(fsm.get_current_possibilities())
                             
                             if fsm.process_token(token):
                                 states.append(fsm.state)